@@ -1,25 +1,27 @@
-import requests
-import json
+import asyncio
+import httpx
+import orjson
 
 # URL of the FastAPI backend
 API_URL = "http://127.0.0.1:8000/ask"
+STREAM_URL = "http://127.0.0.1:8000/ask/stream"
 
-def ask_consultant(question: str):
+async def ask_consultant(client: httpx.AsyncClient, question: str):
     """
     Sends a question to the AI consultant API and prints the response.
     """
     payload = {"question": question}
-    headers = {"Content-Type": "application/json"}
 
     print(f"[*] Asking question: {question}\n")
 
     try:
-        response = requests.post(API_URL, data=json.dumps(payload), headers=headers)
+        response = await client.post(API_URL, json=payload)
         response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
 
-        data = response.json()
+        data = orjson.loads(response.content)
 
         print("="*50)
+        print(f"Question: {question}")
         print(f"Answer: {data.get('answer')}")
         print("-"*50)
         print(f"Status: {data.get('status')}")
@@ -27,28 +29,85 @@ def ask_consultant(question: str):
         print("Source Text Used:")
         print(data.get('source'))
         print("="*50)
+        print("\n\n")
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"[!] Error connecting to the API: {e}")
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print("[!] Error: Failed to decode JSON from response.")
         print(f"    Response text: {response.text}")
 
 
-if __name__ == "__main__":
+async def stream_consultant(client: httpx.AsyncClient, question: str):
+    """
+    Sends a question to the streaming endpoint and prints the answer as it is generated.
+    """
+    payload = {"question": question}
+
+    print(f"[*] Streaming question: {question}\n")
+
+    try:
+        async with client.stream("POST", STREAM_URL, json=payload) as response:
+            response.raise_for_status()
+
+            print("="*50)
+            print("Answer: ", end="", flush=True)
+            event = None
+            source = None
+            async for line in response.aiter_lines():
+                # Server-Sent Events arrive as "event: <name>" followed by "data: <json>"
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = orjson.loads(line[len("data: "):])
+                    if event == "token":
+                        print(data.get('text'), end="", flush=True)
+                    elif event == "context":
+                        source = data.get('source')
+                    elif event == "done":
+                        print()
+                        # The streamed text is not the answer when the context was not found,
+                        # so show the final answer and source from the "done" event instead
+                        if data.get('status') == "CONTEXT_NOT_FOUND":
+                            print(f"Answer: {data.get('answer')}")
+                        print("-"*50)
+                        print(f"Status: {data.get('status')}")
+                        print("-"*50)
+                        print("Source Text Used:")
+                        print(data.get('source', source))
+                    elif event == "error":
+                        print(f"\n[!] Error from the API: {data.get('detail')}")
+            print("="*50)
+
+    except httpx.HTTPError as e:
+        print(f"[!] Error connecting to the API: {e}")
+    except orjson.JSONDecodeError:
+        print("[!] Error: Failed to decode an event from the stream.")
+
+
+async def main():
     #Modify the questions as per your documents.
     # --- Test Case 1: Question that can be answered from context ---
     question_1 = ""
-    ask_consultant(question_1)
-
-    print("\n\n")
 
     # --- Test Case 2: Another question that can be answered ---
     question_2 = ""
-    ask_consultant(question_2)
-    
-    print("\n\n")
 
     # --- Test Case 3: Question that CANNOT be answered from context ---
     question_3 = ""
-    ask_consultant(question_3)
\ No newline at end of file
+
+    # The questions are independent, so send them concurrently over one pooled client.
+    # The LLM can take a while, so allow a generous read timeout.
+    async with httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=300.0)) as client:
+        await asyncio.gather(
+            ask_consultant(client, question_1),
+            ask_consultant(client, question_2),
+            ask_consultant(client, question_3),
+        )
+
+        # --- Test Case 4: Stream an answer token by token ---
+        await stream_consultant(client, question_1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
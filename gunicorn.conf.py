@@ -0,0 +1,35 @@
+# Gunicorn config for production serving: gunicorn main:app -c gunicorn.conf.py
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+
+def default_workers() -> int:
+    """
+    Sizes workers by cores on CPU hosts. On GPU hosts every worker loads MiniLM and the
+    FAISS GPU resources into its own CUDA context, so run one worker per GPU instead.
+    """
+    if os.getenv("EMBEDDING_DEVICE", "cuda") != "cpu":
+        import torch
+        # device_count() queries NVML without initializing CUDA in the master process,
+        # so the forked workers can still use the GPU
+        num_gpus = torch.cuda.device_count()
+        if num_gpus > 0:
+            return num_gpus
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+# The workload is I/O bound (Ollama calls) with bursts of CPU (embeddings), so size by cores.
+# Do not set `threads`: the async worker already overlaps requests on its event loop.
+# main.py limits each worker to one OMP/MKL thread, so workers do not fight over cores.
+workers = int(os.getenv("WEB_CONCURRENCY", default_workers()))
+# Runs uvicorn with loop="auto" and http="auto", which pick uvloop and httptools when installed
+worker_class = "uvicorn_worker.UvicornWorker"
+# worker_connections is not set: gunicorn only applies it to eventlet/gevent workers,
+# and UvicornWorker ignores it, so it would not cap concurrency. keepalive is passed
+# through to uvicorn as timeout_keep_alive.
+keepalive = 5
+
+# Loading the embeddings model and building the index can take a while on startup
+timeout = 120
@@ -1,22 +1,64 @@
+import os
+
+# Every server worker is its own process, so each one gets a single BLAS/OpenMP thread
+# instead of one per core; otherwise workers oversubscribe the CPU under load.
+# These must be set before torch and faiss are imported. Override them for single-process runs.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+
+import asyncio
+import hashlib
+import json
 import logging
+import sys
+import uuid
+import faiss
+import httpx
+import numpy as np
+import orjson
+import torch
+import uvicorn
+from cachetools import LRUCache
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 
 # LangChain Imports
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_ollama import OllamaLLM
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("ai_consultant")
 
+
+def parse_thread_count(value: str) -> int:
+    """
+    Returns the outer thread count from an OMP_NUM_THREADS value. Nested settings
+    such as "4,2" use their first field; empty or invalid values fall back to 1.
+    """
+    try:
+        return max(1, int(value.split(",")[0]))
+    except ValueError:
+        return 1
+
+
+INFERENCE_THREADS = parse_thread_count(os.environ.get("OMP_NUM_THREADS", "1"))
+torch.set_num_threads(INFERENCE_THREADS)
+faiss.omp_set_num_threads(INFERENCE_THREADS)
+
 # --- Knowledge Base Articles ---
 ARTICLE_1 = """
 Article 1:
@@ -41,9 +83,62 @@ KNOWLEDGE_BASE = [
     Document(page_content=ARTICLE_4, metadata={"source": "Article 4: "})
 ]
 
+# --- RAG Prompt ---
+# A prompt template that forces the LLM to answer only from context
+# and to output a specific string if the answer is not found.
+# Parsed once at import time rather than on every request.
+RAG_PROMPT = ChatPromptTemplate.from_template("""
+Answer the user's question based strictly and exclusively on the provided context.
+If the answer is not contained in the context, respond with exactly: CONTEXT_NOT_FOUND
+
+<context>
+{context}
+</context>
+
+Question: {input}
+""")
+RETRIEVER_K = 2  # Retrieve top 2 chunks
+NOT_FOUND_ANSWER = "I could not find an answer to your question in the provided marketing articles."
+NOT_FOUND_SOURCE = "No relevant context found."
+
+# --- Embedding Settings ---
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+# "torch" (default) or "onnx" to run the model under ONNX Runtime (pip install "sentence-transformers[onnx]")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# ONNX weights to load, e.g. the int8 "onnx/model_qint8_avx512_vnni.onnx" export shipped with MiniLM
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+
+# --- Vector Index Settings ---
+# "hnsw" (default) for fast approximate search on CPU, "flat" for exact brute-force search,
+# "sq8" for an int8 scalar-quantized index (4x smaller vectors, small recall loss),
+# "pq_fastscan" for 4-bit PQ codes searched with SIMD FastScan kernels plus exact re-ranking,
+# or "cagra" for the cuVS GPU graph index (needs a FAISS build with -DFAISS_ENABLE_CUVS=ON).
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "hnsw")
+HNSW_M = 32                 # Graph neighbours per node: higher = better recall, more memory
+HNSW_EF_CONSTRUCTION = 200  # Build-time search depth
+HNSW_EF_SEARCH = 64         # Query-time search depth: higher = better recall, slower queries
+PQ_M = 48                   # Sub-quantizers: 384-dim MiniLM vectors are split into 48 blocks of 8 dims
+PQ_NBITS = 4                # FastScan kernels require 4-bit codes
+REFINE_K_FACTOR = 4         # PQ candidates per result that are re-ranked with exact vectors
+CAGRA_GRAPH_DEGREE = 32
+CAGRA_INTERMEDIATE_GRAPH_DEGREE = 64
+# Built CPU indexes are saved here and memory-mapped on later startups, so workers skip the
+# rebuild and share one copy of the index codes through the OS page cache (needs FAISS >= 1.11)
+INDEX_CACHE_DIR = os.getenv("INDEX_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".index_cache"))
+
+# --- Retrieval Batching Settings ---
+RETRIEVAL_BATCH_WINDOW = 0.005  # Seconds to wait for concurrent queries to join a batch
+RETRIEVAL_MAX_BATCH_SIZE = 64
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = 32
+
+# --- Semantic Cache Settings ---
+SEMANTIC_CACHE_THRESHOLD = 0.95  # Minimum cosine similarity for a past question to count as a hit
+SEMANTIC_CACHE_SIZE = 1024       # Maximum number of cached answers (least recently used are evicted)
+
 app = FastAPI(
     title="AI Consultant API",
-    description="A RAG-powered API to answer questions based on a fixed knowledge base."
+    description="A RAG-powered API to answer questions based on a fixed knowledge base.",
 )
 
 # Configure CORS
@@ -58,26 +153,399 @@ app.add_middleware(
 # Global variable to hold the vector store
 vector_store = None
 
+# GPU resources must outlive the GPU indexes that use them
+gpu_resources = None
+
+
+def move_index_to_gpu(index):
+    """
+    Moves a CPU FAISS index onto all available GPUs, falling back to the CPU index
+    when FAISS was built without GPU support or no GPU is present.
+    """
+    if hasattr(faiss, "GpuIndex") and isinstance(index, faiss.GpuIndex):
+        return index
+
+    try:
+        # faiss-cpu builds do not ship the GPU symbols at all
+        faiss.StandardGpuResources()
+        num_gpus = faiss.get_num_gpus()
+    except (AttributeError, RuntimeError) as e:
+        logger.info(f"GPU FAISS unavailable, keeping index on CPU: {e}")
+        return index
+    if num_gpus == 0:
+        logger.info("No GPU detected, keeping FAISS index on CPU.")
+        return index
+
+    try:
+        gpu_index = faiss.index_cpu_to_all_gpus(index)
+    except RuntimeError as e:
+        # The GPU cloner only supports some index types, e.g. not HNSW, SQ8 or PQ FastScan
+        logger.warning(
+            f"{type(index).__name__} cannot be moved to GPU, keeping it on CPU. "
+            f"Use FAISS_INDEX_TYPE=flat or cagra for GPU search: {e}"
+        )
+        return index
+    logger.info(f"Moved FAISS index to {num_gpus} GPU(s).")
+    return gpu_index
+
+
+def build_cagra_index(vectors: np.ndarray):
+    """
+    Builds a cuVS CAGRA graph index on the GPU. Returns None when FAISS has no cuVS
+    support, no GPU is present, or the corpus is too small to build the graph.
+    """
+    global gpu_resources
+    if not hasattr(faiss, "GpuIndexCagra") or faiss.get_num_gpus() == 0:
+        logger.info("CAGRA is not available in this FAISS build or no GPU was found.")
+        return None
+    if len(vectors) <= CAGRA_INTERMEDIATE_GRAPH_DEGREE:
+        logger.info(f"Only {len(vectors)} vectors, too few to build a CAGRA graph.")
+        return None
+
+    if gpu_resources is None:
+        gpu_resources = faiss.StandardGpuResources()
+    config = faiss.GpuIndexCagraConfig()
+    config.graph_degree = CAGRA_GRAPH_DEGREE
+    config.intermediate_graph_degree = CAGRA_INTERMEDIATE_GRAPH_DEGREE
+
+    index = faiss.GpuIndexCagra(gpu_resources, vectors.shape[1], faiss.METRIC_INNER_PRODUCT, config)
+    # Training builds the graph over the given vectors, no separate add() is needed
+    index.train(vectors)
+    logger.info(f"Built GpuIndexCagra with {index.ntotal} vectors of dimension {vectors.shape[1]}.")
+    return index
+
+
+def build_faiss_index(vectors: np.ndarray):
+    """
+    Builds the raw FAISS index configured by FAISS_INDEX_TYPE and adds the given vectors.
+    """
+    # Embeddings are L2-normalized, so inner product equals cosine similarity and
+    # saves the subtraction an L2 distance needs per dimension
+    dim = vectors.shape[1]
+    if FAISS_INDEX_TYPE == "cagra":
+        index = build_cagra_index(vectors)
+        if index is not None:
+            return index
+        logger.info("Falling back to an HNSW index on CPU.")
+
+    # PQ training clusters each block into 2**PQ_NBITS centroids, which needs at least that many vectors
+    use_pq = FAISS_INDEX_TYPE == "pq_fastscan" and len(vectors) >= 2 ** PQ_NBITS
+    if FAISS_INDEX_TYPE == "pq_fastscan" and not use_pq:
+        logger.info(f"Only {len(vectors)} vectors, too few to train PQ. Falling back to an HNSW index.")
+
+    if use_pq:
+        # FastScan stores the codes interleaved so SIMD shuffles do the table lookups for
+        # many vectors at once; the flat refine index re-ranks the top candidates exactly
+        index = faiss.IndexRefineFlat(faiss.IndexPQFastScan(dim, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT))
+        index.k_factor = REFINE_K_FACTOR
+    elif FAISS_INDEX_TYPE == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif FAISS_INDEX_TYPE == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+
+    # Quantized indexes learn their value ranges or codebooks from the data before vectors can be added
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    logger.info(f"Built {type(index).__name__} with {index.ntotal} vectors of dimension {dim}.")
+    return index
+
+
+def index_cache_path(chunks) -> str:
+    """
+    Returns the cache file prefix for these chunks. The key covers everything that
+    changes the built index, so a stale cache is never loaded.
+    """
+    key = hashlib.sha256()
+    key.update(json.dumps([EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE, FAISS_INDEX_TYPE,
+                           HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, PQ_M, PQ_NBITS, REFINE_K_FACTOR]).encode())
+    for chunk in chunks:
+        key.update(json.dumps([chunk.page_content, chunk.metadata], sort_keys=True).encode())
+    return os.path.join(INDEX_CACHE_DIR, key.hexdigest()[:16])
+
+
+def save_index_cache(path: str, index, ids, chunks):
+    """
+    Writes the index and its documents to disk. Files are written under a temporary
+    name and renamed, so concurrently starting workers never read a partial file.
+    """
+    os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+    tmp_suffix = f".{os.getpid()}.tmp"
+
+    # The docs file is written first: once the index file exists, both are complete
+    with open(path + ".json" + tmp_suffix, "w") as f:
+        json.dump({"ids": ids, "documents": [{"page_content": c.page_content, "metadata": c.metadata} for c in chunks]}, f)
+    os.replace(path + ".json" + tmp_suffix, path + ".json")
+
+    faiss.write_index(index, path + ".faiss" + tmp_suffix)
+    os.replace(path + ".faiss" + tmp_suffix, path + ".faiss")
+    logger.info(f"Saved FAISS index cache to {path}.faiss")
+    remove_stale_index_caches(path)
+
+
+def remove_stale_index_caches(path: str):
+    """
+    Deletes cache files from older knowledge bases or settings, and temporary files left
+    behind by workers that died mid-save. Files for the current cache prefix are kept.
+    """
+    prefix = os.path.basename(path)
+    for name in os.listdir(INDEX_CACHE_DIR):
+        if name.startswith(prefix) or not name.endswith((".faiss", ".json", ".tmp")):
+            continue
+        try:
+            os.remove(os.path.join(INDEX_CACHE_DIR, name))
+            logger.info(f"Removed stale index cache file {name}")
+        except OSError as e:
+            logger.warning(f"Could not remove stale index cache file {name}: {e}")
+
+
+def load_index_cache(path: str):
+    """
+    Memory-maps a cached index. Returns (index, ids, chunks), or None if there is no cache.
+    """
+    if not os.path.exists(path + ".faiss"):
+        return None
+
+    # IO_FLAG_MMAP only maps IVF inverted lists; IO_FLAG_MMAP_IFC also maps the flat,
+    # scalar-quantizer, PQ and HNSW storage codes used by the index types built here
+    index = faiss.read_index(path + ".faiss", faiss.IO_FLAG_MMAP_IFC)
+    with open(path + ".json") as f:
+        data = json.load(f)
+    if index.ntotal != len(data["ids"]):
+        logger.warning(f"Cached index has {index.ntotal} vectors but {len(data['ids'])} documents, rebuilding.")
+        return None
+    chunks = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in data["documents"]]
+    logger.info(f"Memory-mapped cached {type(index).__name__} with {index.ntotal} vectors from {path}.faiss")
+    return index, data["ids"], chunks
+
+
+def build_vector_store(chunks, embeddings) -> FAISS:
+    """
+    Loads the FAISS index from the on-disk cache or, on a cache miss, embeds all chunks
+    in a single batched call and builds it. The index is wrapped in LangChain's FAISS vector store.
+    """
+    cache_path = index_cache_path(chunks)
+    cached = None
+    try:
+        cached = load_index_cache(cache_path)
+    except Exception as e:
+        logger.warning(f"Could not load FAISS index cache, rebuilding: {e}")
+
+    if cached is not None:
+        index, ids, chunks = cached
+    else:
+        vectors = np.array(embeddings.embed_documents([chunk.page_content for chunk in chunks]), dtype="float32")
+        index = build_faiss_index(vectors)
+        ids = [str(uuid.uuid4()) for _ in chunks]
+        # CAGRA indexes live on the GPU and cannot be serialized. Its CPU fallback is not cached
+        # either, so a later startup on a GPU host still builds CAGRA instead of loading HNSW
+        if FAISS_INDEX_TYPE != "cagra":
+            try:
+                save_index_cache(cache_path, index, ids, chunks)
+            except OSError as e:
+                logger.warning(f"Could not save FAISS index cache: {e}")
+
+    index = move_index_to_gpu(index)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, chunks))),
+        index_to_docstore_id=dict(enumerate(ids)),
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+    )
+
+
+class RetrievalBatcher:
+    """
+    Coalesces concurrent retrieval queries into one FAISS search. Queries that arrive with a
+    precomputed embedding (as /ask passes from its semantic-cache lookup) only share the search;
+    queries without one (from /ask/stream) are also embedded together in one batched call.
+    """
+    def __init__(self, vector_store: FAISS, k: int):
+        self.vector_store = vector_store
+        self.k = k
+        self.queue = asyncio.Queue()
+        self.worker = None
+
+    async def search(self, query: str, vector: np.ndarray = None):
+        # Started lazily so the worker runs on the server's event loop
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, vector, future))
+        return await future
+
+    async def close(self):
+        if self.worker is not None and not self.worker.done():
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(RETRIEVAL_BATCH_WINDOW)
+            while len(batch) < RETRIEVAL_MAX_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                results = await asyncio.to_thread(
+                    self.search_batch, [query for query, _, _ in batch], [vector for _, vector, _ in batch]
+                )
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, _, future), docs in zip(batch, results):
+                    if not future.done():
+                        future.set_result(docs)
+
+    def search_batch(self, queries, vectors=None):
+        store = self.vector_store
+        vectors = list(vectors) if vectors is not None else [None] * len(queries)
+
+        # Embed only the queries that came without a vector, in one batched call
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = store.embedding_function.embed_documents([queries[i] for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+
+        matrix = np.array([np.asarray(vector, dtype="float32").reshape(-1) for vector in vectors])
+        _, ids = store.index.search(matrix, self.k)
+        # FAISS pads with -1 when fewer than k vectors are indexed
+        return [[store.docstore.search(store.index_to_docstore_id[i]) for i in row if i != -1] for row in ids]
+
+
+class BatchedRetriever(BaseRetriever):
+    """
+    LangChain retriever that sends async queries through a RetrievalBatcher.
+    """
+    batcher: RetrievalBatcher
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun):
+        return self.batcher.search_batch([query])[0]
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun):
+        return await self.batcher.search(query)
+
+
+class EvictingLRUCache(LRUCache):
+    """
+    LRUCache that reports evicted keys so they can be removed from the FAISS cache index.
+    """
+    def __init__(self, maxsize, on_evict):
+        super().__init__(maxsize)
+        self.on_evict = on_evict
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.on_evict(key)
+        return key, value
+
+
+class SemanticCache:
+    """
+    Caches responses keyed by question embedding, so repeated or near-duplicate
+    questions are answered without running retrieval and the LLM again.
+    """
+    def __init__(self, embeddings, dim: int, threshold: float = SEMANTIC_CACHE_THRESHOLD, maxsize: int = SEMANTIC_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        # Inner product over L2-normalized vectors is cosine similarity
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.entries = EvictingLRUCache(maxsize, on_evict=self._remove)
+        self.next_id = 0
+
+    def _remove(self, entry_id: int):
+        self.index.remove_ids(np.array([entry_id], dtype="int64"))
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.array([self.embeddings.embed_query(question)], dtype="float32")
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, vector: np.ndarray):
+        if self.index.ntotal == 0:
+            return None
+        scores, ids = self.index.search(vector, 1)
+        if ids[0][0] == -1 or scores[0][0] < self.threshold:
+            return None
+        # get() also marks the entry as recently used
+        return self.entries.get(int(ids[0][0]))
+
+    def insert(self, vector: np.ndarray, response):
+        entry_id = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+        self.entries[entry_id] = response
+
 @app.on_event("startup")
 def startup_event():
     """
-    On application startup, load articles, create embeddings, and build the vector store.
+    On application startup, load articles, create embeddings, build the vector store and the RAG chain.
     """
     global vector_store
     logger.info("Application startup: Initializing RAG pipeline...")
     
     try:
-        # 1. Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        chunks = text_splitter.split_documents(KNOWLEDGE_BASE)
-        logger.info(f"Split knowledge base into {len(chunks)} chunks.")
+        # 1. Split documents into chunks, unless the whole knowledge base already fits in one chunk
+        chunk_size = 500
+        if sum(len(doc.page_content) for doc in KNOWLEDGE_BASE) < chunk_size:
+            chunks = list(KNOWLEDGE_BASE)
+            logger.info(f"Knowledge base is smaller than one chunk, using its {len(chunks)} documents as-is.")
+        else:
+            text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=50)
+            chunks = text_splitter.split_documents(KNOWLEDGE_BASE)
+            logger.info(f"Split knowledge base into {len(chunks)} chunks.")
 
         # 2. Load open-source embeddings model
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        # Chunks are embedded in batched forward passes and normalized for inner-product search
+        model_kwargs = {"device": EMBEDDING_DEVICE}
+        if EMBEDDING_BACKEND == "onnx":
+            model_kwargs["backend"] = "onnx"
+            # ONNX Runtime sizes its thread pool by physical cores and ignores OMP_NUM_THREADS
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = INFERENCE_THREADS
+            session_options.inter_op_num_threads = 1
+            model_kwargs["model_kwargs"] = {"file_name": EMBEDDING_ONNX_FILE, "session_options": session_options}
+        embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            model_kwargs=model_kwargs,
+            encode_kwargs={"batch_size": 64, "normalize_embeddings": True},
+        )
+        logger.info(f"Loaded embeddings model on {EMBEDDING_DEVICE} with the {EMBEDDING_BACKEND} backend.")
 
         # 3. Create FAISS vector store
-        vector_store = FAISS.from_documents(chunks, embedding=embeddings)
+        vector_store = build_vector_store(chunks, embeddings)
         logger.info("FAISS vector store created successfully.")
+        app.state.semantic_cache = SemanticCache(embeddings, vector_store.index.d)
+
+        # 4. Build the LLM and RAG chain once and reuse them for every request
+        # Initialize LLM - using Ollama
+        # modify this as per your need. This phi3:mini is the basic one for small text based conversations
+        # running using local ollama
+        # One pooled HTTP client per process keeps connections to Ollama alive between requests
+        app.state.llm = OllamaLLM(
+            model="phi3:mini",
+            client_kwargs={"limits": httpx.Limits(max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS)},
+        )
+        app.state.prompt = RAG_PROMPT
+
+        # Create the RAG chain
+        app.state.batcher = RetrievalBatcher(vector_store, RETRIEVER_K)
+        retriever = BatchedRetriever(batcher=app.state.batcher)
+        app.state.document_chain = create_stuff_documents_chain(app.state.llm, app.state.prompt)
+        app.state.retrieval_chain = create_retrieval_chain(retriever, app.state.document_chain)
+        logger.info("RAG chain created successfully.")
 
     except Exception as e:
         logger.error(f"Error during startup initialization: {e}")
@@ -86,6 +554,16 @@ def startup_event():
         raise RuntimeError(f"Failed to initialize the RAG pipeline: {e}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    On application shutdown, stop the retrieval batcher's background task.
+    """
+    batcher = getattr(app.state, "batcher", None)
+    if batcher is not None:
+        await batcher.close()
+
+
 # --- Pydantic Models for Request and Response ---
 class AskRequest(BaseModel):
     question: str
@@ -108,42 +586,28 @@ async def ask_question(request: AskRequest):
     logger.info(f"Received question: {request.question}")
 
     try:
-        # Initialize LLM - using Ollama 
-        # modify this as per your need. This phi3:mini is the basic one for small text based conversations
-        # running using local ollama 
-        llm = OllamaLLM(model="phi3:mini")
-
-        # Create a prompt template that forces the LLM to answer only from context
-        # and to output a specific string if the answer is not found.
-        prompt = ChatPromptTemplate.from_template("""
-        Answer the user's question based strictly and exclusively on the provided context.
+        # Serve repeated or near-duplicate questions from the semantic cache
+        cache = app.state.semantic_cache
+        question_vector = await asyncio.to_thread(cache.embed, request.question)
+        cached_response = cache.lookup(question_vector)
+        if cached_response is not None:
+            logger.info("Semantic cache hit, returning cached answer.")
+            return cached_response
 
-        <context>
-        {context}
-        </context>
-
-        Question: {input}
-        """)
-
-        # Create the RAG chain
-        retriever = vector_store.as_retriever(search_kwargs={'k': 2}) # Retrieve top 2 chunks
-        document_chain = create_stuff_documents_chain(llm, prompt)
-        retrieval_chain = create_retrieval_chain(retriever, document_chain)
-
-        # Invoke the chain
-        response = retrieval_chain.invoke({"input": request.question})
-        
-        answer = response.get("answer", "").strip()
-        context_docs = response.get("context", [])
+        # Retrieve with the question embedding already computed for the cache lookup,
+        # then run the document chain built at startup over the retrieved chunks
+        context_docs = await app.state.batcher.search(request.question, question_vector)
+        answer = await app.state.document_chain.ainvoke({"input": request.question, "context": context_docs})
+        answer = answer.strip()
 
         # Format the source text from the retrieved documents
         source_text = "\n---\n".join([doc.page_content for doc in context_docs])
 
         # Check if the LLM indicated that the context was not found
-        if "CONTEXT_NOT_FOUND" or "context_not_found" or "ConTEXT_NOT_FOUND" in answer:
+        if "CONTEXT_NOT_FOUND" in answer.upper():
             status = "CONTEXT_NOT_FOUND"
-            final_answer = "I could not find an answer to your question in the provided marketing articles."
-            source_text = "No relevant context found." # Clear source if not found
+            final_answer = NOT_FOUND_ANSWER
+            source_text = NOT_FOUND_SOURCE # Clear source if not found
         else:
             status = "ANSWERED_FROM_CONTEXT"
             final_answer = answer
@@ -151,8 +615,85 @@ async def ask_question(request: AskRequest):
         logger.info(f"Generated Answer: {final_answer}")
         logger.info(f"Status: {status}")
         
-        return AskResponse(answer=final_answer, source=source_text, status=status)
+        ask_response = AskResponse(answer=final_answer, source=source_text, status=status)
+        cache.insert(question_vector, ask_response)
+        return ask_response
 
     except Exception as e:
         logger.error(f"Error processing question: {e}")
-        raise HTTPException(status_code=500, detail=f"An error occurred while processing your request: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An error occurred while processing your request: {e}")
+
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    Formats one Server-Sent Event.
+    """
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: AskRequest):
+    """
+    Streams the answer as Server-Sent Events while the LLM generates it: a "context" event
+    with the source text, "token" events with answer chunks, then a "done" event with the status
+    and the final answer and source, which match what /ask would return.
+    """
+    if vector_store is None:
+        logger.error("Vector store not initialized. The application may have failed to start correctly.")
+        raise HTTPException(status_code=500, detail="Vector store is not available.")
+
+    logger.info(f"Received streaming question: {request.question}")
+
+    async def event_stream():
+        answer = ""
+        source_text = ""
+        released = False
+        try:
+            async for chunk in app.state.retrieval_chain.astream({"input": request.question}):
+                if "context" in chunk:
+                    source_text = "\n---\n".join([doc.page_content for doc in chunk["context"]])
+                if "answer" not in chunk:
+                    continue
+                answer += chunk["answer"]
+                if released:
+                    yield sse_event("token", {"text": chunk["answer"]})
+                # Hold back the context and tokens while the answer could still be the sentinel
+                elif not "CONTEXT_NOT_FOUND".startswith(answer.strip().upper()):
+                    released = True
+                    yield sse_event("context", {"source": source_text})
+                    yield sse_event("token", {"text": answer})
+
+            # Check if the LLM indicated that the context was not found
+            if "CONTEXT_NOT_FOUND" in answer.upper():
+                status = "CONTEXT_NOT_FOUND"
+                final_answer = NOT_FOUND_ANSWER
+                source_text = NOT_FOUND_SOURCE
+            else:
+                status = "ANSWERED_FROM_CONTEXT"
+                final_answer = answer.strip()
+                if not released:
+                    yield sse_event("context", {"source": source_text})
+                    yield sse_event("token", {"text": answer})
+
+            logger.info(f"Streamed Answer: {final_answer}")
+            logger.info(f"Status: {status}")
+            yield sse_event("done", {"status": status, "answer": final_answer, "source": source_text})
+
+        except Exception as e:
+            # The response has already started, so the error is reported as an event
+            logger.error(f"Error streaming answer: {e}")
+            yield sse_event("error", {"detail": f"An error occurred while processing your request: {e}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    # Single-process entry point; see gunicorn.conf.py for multi-worker serving.
+    # uvloop is not available on Windows, so fall back to the default asyncio loop there.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+    )